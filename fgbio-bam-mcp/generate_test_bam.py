@@ -2,219 +2,364 @@
 """Generate a synthetic BAM file for testing fgbio tools."""
 
 import pysam
+import numpy as np
 import random
 import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def generate_synthetic_bam(output_path: str, num_reads: int = 1000):
-    """Generate a synthetic BAM file with realistic read data.
-    
+try:
+    import numba
+except ImportError:  # optional acceleration only
+    numba = None
+
+# Longest read length the generator produces; sequences and qualities are
+# drawn at this length and sliced per read
+MAX_READ_LENGTH = 150
+
+# Reference sequences (chromosomes) shared by the parent and the workers
+HEADER = {
+    'HD': {'VN': '1.6', 'SO': 'coordinate'},
+    'SQ': [
+        {'LN': 248956422, 'SN': 'chr1'},
+        {'LN': 242193529, 'SN': 'chr2'},
+        {'LN': 198295559, 'SN': 'chr3'},
+        {'LN': 190214555, 'SN': 'chr4'},
+        {'LN': 181538259, 'SN': 'chr5'},
+    ],
+    'RG': [
+        {
+            'ID': 'test_sample',
+            'SM': 'synthetic_sample',
+            'LB': 'test_library',
+            'PL': 'ILLUMINA',
+            'PU': 'test_flowcell.1.test_lane'
+        }
+    ],
+    'PG': [
+        {
+            'ID': 'test_generator',
+            'PN': 'generate_test_bam.py',
+            'VN': '1.0'
+        }
+    ]
+}
+
+
+def _generate_sequences(rng, num_reads: int, max_length: int) -> np.ndarray:
+    """Draw all read-pair sequences in one shot as ASCII bytes (A/T/G/C).
+
+    Returns a (num_reads, 2, max_length) uint8 array of base characters.
+    """
+    base_lut = np.frombuffer(b"ATGC", dtype=np.uint8)
+    return base_lut[rng.integers(0, 4, size=(num_reads, 2, max_length), dtype=np.uint8)]
+
+
+def _generate_qualities_numpy(rng, num_reads: int, max_length: int) -> np.ndarray:
+    """Draw all phred quality scores with bulk NumPy RNG calls."""
+    shape = (num_reads, 2, max_length)
+    tier = rng.random(shape)
+    high = rng.integers(30, 41, size=shape, dtype=np.uint8)
+    medium = rng.integers(20, 30, size=shape, dtype=np.uint8)
+    low = rng.integers(10, 20, size=shape, dtype=np.uint8)
+    return np.where(tier < 0.7, high, np.where(tier < 0.9, medium, low))
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _generate_qualities_jit(num_reads: int, max_length: int) -> np.ndarray:
+        """Tiered quality sampling lowered to LLVM, parallel over reads.
+
+        Draws one value per base instead of NumPy's three full arrays plus
+        two np.where passes, and runs without the GIL across cores.
+        """
+        out = np.empty((num_reads, 2, max_length), dtype=np.uint8)
+        for i in numba.prange(num_reads):
+            for mate in range(2):
+                for j in range(max_length):
+                    tier = np.random.random()
+                    if tier < 0.7:
+                        out[i, mate, j] = np.random.randint(30, 41)
+                    elif tier < 0.9:
+                        out[i, mate, j] = np.random.randint(20, 30)
+                    else:
+                        out[i, mate, j] = np.random.randint(10, 20)
+        return out
+
+
+def _generate_qualities(rng, num_reads: int, max_length: int) -> np.ndarray:
+    """Draw all phred quality scores in one shot.
+
+    Most bases high quality (30-40), some medium (20-29), few low (10-19).
+    Returns a (num_reads, 2, max_length) uint8 array of phred values.
+    Uses the Numba-compiled sampler when numba is installed.
+    """
+    if numba is not None:
+        return _generate_qualities_jit(num_reads, max_length)
+    return _generate_qualities_numpy(rng, num_reads, max_length)
+
+
+def _generate_chunk(start_index: int, num_reads: int, seed,
+                    chunk_path: str, bam_threads: int) -> str:
+    """Generate one coordinate-sorted chunk of read pairs.
+
+    Runs in a worker process: streams its pairs to an uncompressed temp
+    BAM, then sorts the chunk with htslib's external merge sort so the
+    parent only has to merge already-sorted chunks.
+
     Args:
-        output_path: Path where the BAM file will be written
-        num_reads: Number of read pairs to generate
+        start_index: Global index of this chunk's first read pair
+        num_reads: Number of read pairs in this chunk
+        seed: RNG seed (NumPy SeedSequence) for this chunk
+        chunk_path: Path the sorted chunk BAM is written to
+        bam_threads: htslib thread count for compression/sorting
+
+    Returns:
+        chunk_path, for use with pysam.merge in the parent
     """
-    print(f"Generating synthetic BAM file with {num_reads} read pairs...")
-    
-    # Define reference sequences (chromosomes)
-    header = {
-        'HD': {'VN': '1.6', 'SO': 'coordinate'},
-        'SQ': [
-            {'LN': 248956422, 'SN': 'chr1'},
-            {'LN': 242193529, 'SN': 'chr2'},
-            {'LN': 198295559, 'SN': 'chr3'},
-            {'LN': 190214555, 'SN': 'chr4'},
-            {'LN': 181538259, 'SN': 'chr5'},
-        ],
-        'RG': [
-            {
-                'ID': 'test_sample',
-                'SM': 'synthetic_sample',
-                'LB': 'test_library',
-                'PL': 'ILLUMINA',
-                'PU': 'test_flowcell.1.test_lane'
-            }
-        ],
-        'PG': [
-            {
-                'ID': 'test_generator',
-                'PN': 'generate_test_bam.py',
-                'VN': '1.0'
-            }
-        ]
-    }
-    
-    # Quality scores for realistic reads
-    def generate_quality_string(length: int) -> str:
-        """Generate realistic quality scores."""
-        # Most bases high quality (30-40), some medium (20-29), few low (10-19)
-        qualities = []
-        for _ in range(length):
-            rand = random.random()
-            if rand < 0.7:  # 70% high quality
-                qual = random.randint(30, 40)
-            elif rand < 0.9:  # 20% medium quality  
-                qual = random.randint(20, 29)
-            else:  # 10% lower quality
-                qual = random.randint(10, 19)
-            qualities.append(chr(qual + 33))  # Convert to ASCII
-        return ''.join(qualities)
-    
-    def generate_sequence(length: int) -> str:
-        """Generate a random DNA sequence."""
-        bases = ['A', 'T', 'G', 'C']
-        return ''.join(random.choice(bases) for _ in range(length))
-    
-    # Generate all reads first, then sort by coordinate
-    all_reads = []
-    read_names = set()  # Track read names to ensure uniqueness
-    
-    print("Generating reads...")
-    for i in range(num_reads):
-            # Generate unique read name
-            while True:
-                read_name = f"read_{i:06d}"
-                if read_name not in read_names:
-                    read_names.add(read_name)
-                    break
-                i += 1
-            
-            # Choose random chromosome
-            chrom_idx = random.randint(0, 4)
-            chrom_name = f"chr{chrom_idx + 1}"
-            chrom_length = header['SQ'][chrom_idx]['LN']
-            
-            # Read parameters
-            read_length = random.choice([75, 100, 150])  # Common read lengths
-            insert_size = random.randint(200, 800)  # Typical insert size range
-            
-            # Position for read 1 (ensure room for insert)
-            max_pos = chrom_length - insert_size - read_length
-            if max_pos < 1:
-                max_pos = chrom_length // 2
-            pos1 = random.randint(1, max_pos)
+    # Draw all sequences and qualities up front with bulk NumPy RNG; per-base
+    # Python loops cost millions of interpreter round-trips at this scale
+    rng = np.random.default_rng(seed)
+    seq_bytes = _generate_sequences(rng, num_reads, MAX_READ_LENGTH)
+    qual_phred = _generate_qualities(rng, num_reads, MAX_READ_LENGTH)
+
+    # Per-read event outcomes and mapping qualities, also drawn in bulk so
+    # the hot loop only indexes precomputed masks
+    dup_mask = rng.random(num_reads) < 0.05        # 5% duplicates
+    unmapped1_mask = rng.random(num_reads) < 0.02  # 2% unmapped per mate
+    unmapped2_mask = rng.random(num_reads) < 0.02
+    secondary_mask = rng.random(num_reads) < 0.01  # 1% secondary alignments
+
+    # Assemble the flag words branchlessly from the masks: both mates share
+    # the duplicate bit, each mate carries its own unmapped bit. One pass of
+    # vectorized ORs replaces four conditional |= statements per pair.
+    flags1 = np.full(num_reads, 99, dtype=np.int32)   # Paired, first in pair, mate reverse strand
+    flags2 = np.full(num_reads, 147, dtype=np.int32)  # Paired, second in pair, reverse strand
+    flags1 |= dup_mask.astype(np.int32) * 1024
+    flags2 |= dup_mask.astype(np.int32) * 1024
+    flags1 |= unmapped1_mask.astype(np.int32) * 4
+    flags2 |= unmapped2_mask.astype(np.int32) * 4
+    mapq_values = rng.choice(
+        np.array([0, 1, 10, 20, 30, 40, 60]),
+        size=num_reads,
+        p=np.array([5, 5, 10, 15, 25, 25, 15]) / 100.0
+    )
+
+    # Coordinates batched the same way: chromosome, read length and insert
+    # size as bulk draws, then a vectorized read-1 position that respects
+    # per-chromosome bounds (fall back to mid-chromosome when the insert
+    # would not fit)
+    chrom_lengths = np.array([sq['LN'] for sq in HEADER['SQ']], dtype=np.int64)
+    chrom_idx_values = rng.integers(0, len(chrom_lengths), size=num_reads)
+    read_length_values = rng.choice(np.array([75, 100, 150]), size=num_reads)  # Common read lengths
+    insert_size_values = rng.integers(200, 801, size=num_reads)  # Typical insert size range
+    max_pos = chrom_lengths[chrom_idx_values] - insert_size_values - read_length_values
+    max_pos = np.where(max_pos < 1, chrom_lengths[chrom_idx_values] // 2, max_pos)
+    pos1_values = (rng.random(num_reads) * max_pos).astype(np.int64) + 1
+
+    # Only three read lengths exist, so the all-match CIGARs and the shared
+    # read-group tag can be built once instead of per read
+    cigars = {length: [(0, length)] for length in (75, 100, 150)}
+    rg_tag = ('RG', 'test_sample')
+
+    # Stream reads to a temp uncompressed BAM as they are generated instead
+    # of accumulating AlignedSegment objects in memory, then let htslib's
+    # multi-threaded external merge sort produce the sorted chunk. Memory
+    # stays flat no matter how large num_reads gets.
+    unsorted_path = chunk_path + ".unsorted.bam"
+
+    # Reused record buffers: htslib copies each record into the BGZF stream
+    # on write, so the same AlignedSegment objects can be overwritten every
+    # iteration instead of allocating two or three fresh ones per pair.
+    # Every field is reassigned each pass, so no state leaks between reads.
+    read1 = pysam.AlignedSegment()
+    read2 = pysam.AlignedSegment()
+    secondary_read = pysam.AlignedSegment()
+
+    with pysam.AlignmentFile(unsorted_path, "wbu", header=HEADER, threads=bam_threads) as outfile:
+        for i in range(num_reads):
+            # Names derived from the global index are unique by construction
+            read_name = f"read_{start_index + i:06d}"
+
+            # Pull this pair's batched coordinate draws
+            chrom_idx = int(chrom_idx_values[i])
+            read_length = int(read_length_values[i])
+            insert_size = int(insert_size_values[i])
+            pos1 = int(pos1_values[i])
             pos2 = pos1 + insert_size - read_length
-            
-            # Generate sequences and qualities
-            seq1 = generate_sequence(read_length)
-            seq2 = generate_sequence(read_length)
-            qual1 = generate_quality_string(read_length)
-            qual2 = generate_quality_string(read_length)
-            
+
+            # Slice this pair's sequences and qualities out of the bulk draws;
+            # frombytes copies straight from the contiguous phred buffer into
+            # the array, with no intermediate bytes object or ASCII pass
+            seq1 = seq_bytes[i, 0, :read_length].tobytes().decode('ascii')
+            seq2 = seq_bytes[i, 1, :read_length].tobytes().decode('ascii')
+            qual1 = array('B')
+            qual1.frombytes(qual_phred[i, 0, :read_length].data)
+            qual2 = array('B')
+            qual2.frombytes(qual_phred[i, 1, :read_length].data)
+
             # Simulate some mapping quality variation
-            mapq = random.choices([0, 1, 10, 20, 30, 40, 60], 
-                                weights=[5, 5, 10, 15, 25, 25, 15])[0]
-            
-            # Create read 1
-            read1 = pysam.AlignedSegment()
+            mapq = int(mapq_values[i])
+
+            # Fill read 1
             read1.query_name = read_name
             read1.query_sequence = seq1
-            read1.query_qualities = pysam.qualitystring_to_array(qual1)
-            read1.flag = 99  # Paired, first in pair, mate reverse strand
+            read1.query_qualities = qual1
+            read1.flag = int(flags1[i])
             read1.reference_id = chrom_idx
             read1.reference_start = pos1 - 1  # 0-based
             read1.mapping_quality = mapq
-            read1.cigar = [(0, read_length)]  # All matches
+            read1.cigar = cigars[read_length]  # All matches
             read1.next_reference_id = chrom_idx
             read1.next_reference_start = pos2 - 1
             read1.template_length = insert_size
-            read1.tags = [('RG', 'test_sample'), ('AS', read_length - random.randint(0, 5))]
-            
-            # Simulate some duplicates (5% chance)
-            if random.random() < 0.05:
-                read1.flag |= 1024  # Mark as duplicate
-            
-            # Create read 2  
-            read2 = pysam.AlignedSegment()
+            read1.tags = [rg_tag, ('AS', read_length - random.randint(0, 5))]
+
+            # Fill read 2
             read2.query_name = read_name
             read2.query_sequence = seq2
-            read2.query_qualities = pysam.qualitystring_to_array(qual2)
-            read2.flag = 147  # Paired, second in pair, reverse strand
+            read2.query_qualities = qual2
+            read2.flag = int(flags2[i])
             read2.reference_id = chrom_idx
             read2.reference_start = pos2 - 1
             read2.mapping_quality = mapq
-            read2.cigar = [(0, read_length)]  # All matches
+            read2.cigar = cigars[read_length]  # All matches
             read2.next_reference_id = chrom_idx
             read2.next_reference_start = pos1 - 1
             read2.template_length = -insert_size
-            read2.tags = [('RG', 'test_sample'), ('AS', read_length - random.randint(0, 5))]
-            
-            # Copy duplicate flag to mate
-            if read1.flag & 1024:
-                read2.flag |= 1024
-            
-            # Simulate some unmapped reads (2% chance)
-            if random.random() < 0.02:
-                read1.flag |= 4  # Unmapped
+            read2.tags = [rg_tag, ('AS', read_length - random.randint(0, 5))]
+
+            # Clear alignment fields on simulated unmapped reads (the flag
+            # bits themselves were folded in above)
+            if unmapped1_mask[i]:
                 read1.reference_id = -1
                 read1.reference_start = -1
                 read1.mapping_quality = 0
                 read1.cigar = None
-            
-            if random.random() < 0.02:
-                read2.flag |= 4  # Unmapped  
+
+            if unmapped2_mask[i]:
                 read2.reference_id = -1
                 read2.reference_start = -1
                 read2.mapping_quality = 0
                 read2.cigar = None
-            
+
             # Simulate some secondary alignments (1% chance)
-            if random.random() < 0.01:
-                read1_secondary = pysam.AlignedSegment()
-                read1_secondary.query_name = read_name
-                read1_secondary.query_sequence = seq1
-                read1_secondary.query_qualities = pysam.qualitystring_to_array(qual1)
-                read1_secondary.flag = 355  # Secondary alignment
-                read1_secondary.reference_id = random.randint(0, 4)
-                read1_secondary.reference_start = random.randint(1, 1000000)
-                read1_secondary.mapping_quality = random.randint(0, 20)
-                read1_secondary.cigar = [(0, read_length)]
-                read1_secondary.tags = [('RG', 'test_sample')]
-                all_reads.append(read1_secondary)
-            
-            # Add reads to list
-            all_reads.append(read1)
-            all_reads.append(read2)
-    
-    # Sort reads by coordinate
-    print("Sorting reads by coordinate...")
-    all_reads.sort(key=lambda r: (r.reference_id if r.reference_id >= 0 else 999, 
-                                  r.reference_start if r.reference_start >= 0 else 0))
-    
-    # Write sorted BAM file
-    print("Writing sorted BAM file...")
-    with pysam.AlignmentFile(output_path, "wb", header=header) as outfile:
-        for read in all_reads:
-            outfile.write(read)
-    
+            if secondary_mask[i]:
+                secondary_read.query_name = read_name
+                secondary_read.query_sequence = seq1
+                secondary_read.query_qualities = qual1
+                secondary_read.flag = 355  # Secondary alignment
+                secondary_read.reference_id = random.randint(0, 4)
+                secondary_read.reference_start = random.randint(1, 1000000)
+                secondary_read.mapping_quality = random.randint(0, 20)
+                secondary_read.cigar = cigars[read_length]
+                secondary_read.tags = [rg_tag]
+                outfile.write(secondary_read)
+
+            # Write the pair
+            outfile.write(read1)
+            outfile.write(read2)
+
+    # Sort the chunk by coordinate
+    pysam.sort("-@", str(bam_threads), "-o", chunk_path, unsorted_path)
+    os.unlink(unsorted_path)
+    return chunk_path
+
+
+def generate_synthetic_bam(output_path: str, num_reads: int = 1000,
+                           n_workers: int = None):
+    """Generate a synthetic BAM file with realistic read data.
+
+    Read pairs are independent, so generation is split into chunks across
+    worker processes; each worker writes a coordinate-sorted chunk and the
+    parent merges them with htslib's multi-threaded merge.
+
+    Args:
+        output_path: Path where the BAM file will be written
+        num_reads: Number of read pairs to generate
+        n_workers: Worker process count (default: cpu_count, capped so each
+            chunk keeps at least ~1000 pairs)
+    """
+    print(f"Generating synthetic BAM file with {num_reads} read pairs...")
+
+    # BGZF compression is the CPU bottleneck when writing; 4-8 threads
+    # saturate deflate, so default to min(4, cpu_count).
+    bam_threads = min(4, os.cpu_count() or 1)
+
+    # 1 MiB htslib I/O buffering cuts write syscalls roughly 4x versus the
+    # default block size; must be set before the first AlignmentFile open
+    os.environ.setdefault("HTS_BLOCK_SIZE", str(1 << 20))
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    # Tiny chunks pay more in process startup than they save
+    n_workers = max(1, min(n_workers, num_reads // 1000))
+
+    # Independent RNG streams per chunk so parallel workers never overlap
+    seeds = np.random.SeedSequence().spawn(max(n_workers, 1))
+    chunk_sizes = [len(part) for part in np.array_split(np.arange(num_reads), n_workers)]
+
+    print("Generating reads...")
+    if n_workers == 1:
+        chunk_paths = [_generate_chunk(0, num_reads, seeds[0],
+                                       output_path + ".chunk0.bam", bam_threads)]
+    else:
+        chunk_args = []
+        start = 0
+        for worker_idx, size in enumerate(chunk_sizes):
+            chunk_args.append((start, size, seeds[worker_idx],
+                               f"{output_path}.chunk{worker_idx}.bam", bam_threads))
+            start += size
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            chunk_paths = list(pool.map(_generate_chunk, *zip(*chunk_args)))
+
+    # Merge the sorted chunks (or rename the single chunk) into the output
+    print("Merging sorted chunks..." if len(chunk_paths) > 1 else "Sorting reads by coordinate...")
+    if len(chunk_paths) == 1:
+        os.replace(chunk_paths[0], output_path)
+    else:
+        pysam.merge("-f", "-@", str(bam_threads), output_path, *chunk_paths)
+        for chunk_path in chunk_paths:
+            os.unlink(chunk_path)
+
     print(f"✓ Generated BAM file: {output_path}")
-    
+
     # Index the BAM file
     print("Creating BAM index...")
     pysam.index(output_path)
     print(f"✓ Created index: {output_path}.bai")
-    
-    # Print file statistics
+
+    # Mapped/unmapped totals come straight from the BAI just built above --
+    # O(#references) instead of re-reading the file. Only the duplicate and
+    # secondary counts, which the index does not carry, need the C-level
+    # flagstat pass.
     with pysam.AlignmentFile(output_path, "rb") as bamfile:
-        total_reads = 0
-        mapped_reads = 0
-        duplicate_reads = 0
-        secondary_reads = 0
-        
-        for read in bamfile:
-            total_reads += 1
-            if not (read.flag & 4):  # Not unmapped
-                mapped_reads += 1
-            if read.flag & 1024:  # Duplicate
-                duplicate_reads += 1
-            if read.flag & 256:  # Secondary
-                secondary_reads += 1
-        
-        print(f"✓ BAM file stats:")
-        print(f"  Total reads: {total_reads}")
-        print(f"  Mapped reads: {mapped_reads}")
-        print(f"  Unmapped reads: {total_reads - mapped_reads}")
-        print(f"  Duplicate reads: {duplicate_reads}")
-        print(f"  Secondary alignments: {secondary_reads}")
+        index_stats = bamfile.get_index_statistics()
+        mapped_reads = sum(s.mapped for s in index_stats)
+        unmapped_reads = sum(s.unmapped for s in index_stats) + bamfile.nocoordinate
+    total_reads = mapped_reads + unmapped_reads
+
+    flagstat_text = pysam.flagstat("-@", str(bam_threads), output_path)
+
+    def _flagstat_count(label: str) -> int:
+        """Pull a count from flagstat output, e.g. '123 + 0 duplicates'."""
+        for line in flagstat_text.splitlines():
+            passed, rest = line.split(' + ', 1)
+            failed, description = rest.split(' ', 1)
+            if description.startswith(label):
+                return int(passed) + int(failed)
+        return 0
+
+    duplicate_reads = _flagstat_count('duplicates')
+    secondary_reads = _flagstat_count('secondary')
+
+    print(f"✓ BAM file stats:")
+    print(f"  Total reads: {total_reads}")
+    print(f"  Mapped reads: {mapped_reads}")
+    print(f"  Unmapped reads: {total_reads - mapped_reads}")
+    print(f"  Duplicate reads: {duplicate_reads}")
+    print(f"  Secondary alignments: {secondary_reads}")
 
 if __name__ == "__main__":
     # Generate the test BAM file at the project root
@@ -223,4 +368,4 @@ if __name__ == "__main__":
     print(f"\n🎉 Synthetic BAM file generated successfully!")
     print(f"Use this file to test the fgbio MCP tools:")
     print(f"  File: {os.path.abspath(output_file)}")
-    print(f"  Size: {os.path.getsize(output_file) / 1024 / 1024:.2f} MB")
\ No newline at end of file
+    print(f"  Size: {os.path.getsize(output_file) / 1024 / 1024:.2f} MB")
@@ -1,11 +1,29 @@
 """Wrapper class for executing fgbio commands."""
 
+import os
+import shutil
 import subprocess
 import shlex
+import tempfile
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 import logging
 
+# jpype is optional: when installed and FGBIO_JAR points at the fgbio jar,
+# commands run on one long-lived in-process JVM instead of paying 1-2s of
+# JVM startup per subprocess — often more than the sort itself on small BAMs
+try:
+    import jpype
+except ImportError:
+    jpype = None
+
+# pysam is optional and used only to peek at BAM headers (one BGZF block);
+# without it the already-sorted fast path is simply skipped
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -24,7 +42,33 @@ class FgbioWrapper:
             fgbio_command: Path or command to the fgbio executable
         """
         self.fgbio_command = fgbio_command
-        self._validate_fgbio_available()
+        # Size HTSJDK's BGZF compression pool to the cores this process is
+        # allowed to run on; deflate dominates SortBam CPU and the default
+        # is single-threaded. setdefault keeps any operator-supplied
+        # JAVA_OPTS untouched.
+        if hasattr(os, "sched_getaffinity"):
+            n_cpus = len(os.sched_getaffinity(0))
+        else:
+            n_cpus = os.cpu_count() or 1
+        os.environ.setdefault(
+            "JAVA_OPTS", f"-Dsamjdk.compression_threads={max(1, n_cpus - 1)}"
+        )
+        self._jvm_main = None
+        jar = os.environ.get("FGBIO_JAR")
+        if jpype is not None and jar and os.path.isfile(jar):
+            try:
+                if not jpype.isJVMStarted():
+                    jpype.startJVM(classpath=[jar])
+                self._jvm_main = jpype.JClass("com.fulcrumgenomics.cmdline.FgBioMain")
+                logger.info("Using in-process JVM backend (jar: %s)", jar)
+            except Exception as e:
+                logger.warning("In-process JVM unavailable, using subprocess backend: %s", e)
+                self._jvm_main = None
+        # The version probe spawns a JVM (~1-3s); warm-start containers where
+        # fgbio is known to be present can opt out. The in-process backend
+        # already proved the jar is loadable, so it skips the probe too.
+        if self._jvm_main is None and os.environ.get("FGBIO_SKIP_VERSION_CHECK") != "1":
+            self._validate_fgbio_available()
     
     def _validate_fgbio_available(self) -> None:
         """Check if fgbio is available in the system."""
@@ -40,7 +84,7 @@ class FgbioWrapper:
             version_output = result.stderr.strip() or result.stdout.strip()
             if not version_output or "Version:" not in version_output:
                 raise FgbioError(f"fgbio command returned unexpected output: {version_output}")
-            logger.info(f"fgbio version: {version_output}")
+            logger.info("fgbio version: %s", version_output)
         except subprocess.TimeoutExpired:
             raise FgbioError("fgbio command timed out")
         except FileNotFoundError:
@@ -75,25 +119,39 @@ class FgbioWrapper:
         
         return path
     
-    def _build_command(self, tool_name: str, params: Dict[str, Any]) -> List[str]:
+    def _build_command(self, tool_name: str, params: Dict[str, Any],
+                       common_params: Optional[Dict[str, Any]] = None) -> List[str]:
         """Build the fgbio command with parameters.
-        
+
         Args:
             tool_name: Name of the fgbio tool to run
-            params: Dictionary of parameters
-            
+            params: Dictionary of tool parameters
+            common_params: Optional dictionary of fgbio common options
+                (e.g. async-io, compression) that must appear before the tool name
+
         Returns:
             List of command components
         """
-        cmd = [self.fgbio_command, tool_name]
-        
+        cmd = [self.fgbio_command]
+
+        if common_params:
+            self._append_params(cmd, common_params)
+
+        cmd.append(tool_name)
+        self._append_params(cmd, params)
+
+        return cmd
+
+    @staticmethod
+    def _append_params(cmd: List[str], params: Dict[str, Any]) -> None:
+        """Append a parameter dictionary to a command list in fgbio syntax."""
         for key, value in params.items():
             if value is None:
                 continue
-            
+
             # Convert parameter name to kebab-case for fgbio
             param_name = key.replace('_', '-')
-            
+
             if isinstance(value, bool):
                 if value:
                     cmd.append(f"--{param_name}")
@@ -102,63 +160,233 @@ class FgbioWrapper:
                     cmd.extend([f"--{param_name}", str(item)])
             else:
                 cmd.extend([f"--{param_name}", str(value)])
-        
-        return cmd
     
-    def run_command(self, tool_name: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def run_command(self, tool_name: str, params: Dict[str, Any],
+                    common_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Execute a fgbio command with the given parameters.
-        
+
         Args:
             tool_name: Name of the fgbio tool to run
             params: Dictionary of parameters for the tool
-            
+            common_params: Optional fgbio common options placed before the tool name
+
         Returns:
             Dictionary containing execution results
-            
+
         Raises:
             FgbioError: If command execution fails
         """
+        if self._jvm_main is not None:
+            return self._run_in_jvm(tool_name, params, common_params)
+
         try:
-            cmd = self._build_command(tool_name, params)
-            logger.info(f"Executing command: {' '.join(shlex.quote(str(c)) for c in cmd)}")
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=3600  # 1 hour timeout for long-running operations
-            )
-            
-            if result.returncode != 0:
+            cmd = self._build_command(tool_name, params, common_params)
+
+            # Quote the argv lazily: once here when INFO logging is on,
+            # otherwise only for the returned command string
+            cmd_str = None
+            if logger.isEnabledFor(logging.INFO):
+                cmd_str = ' '.join(shlex.quote(str(c)) for c in cmd)
+                logger.info(f"Executing command: {cmd_str}")
+
+            # Spool subprocess output to temp files instead of in-RAM pipes;
+            # fgbio can emit megabytes of progress logging on long runs, and
+            # only the tail is useful to callers
+            with tempfile.SpooledTemporaryFile(max_size=262144) as stdout_f, \
+                 tempfile.SpooledTemporaryFile(max_size=262144) as stderr_f:
+                # Spawned fgbio/htslib processes inherit 1 MiB block
+                # buffering, cutting write syscalls on the output BAM
+                env = dict(os.environ)
+                env.setdefault("HTS_BLOCK_SIZE", str(1 << 20))
+                proc = subprocess.Popen(cmd, stdout=stdout_f, stderr=stderr_f, env=env)
+                try:
+                    return_code = proc.wait(timeout=3600)  # 1 hour timeout for long-running operations
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+                    raise
+                stdout = self._read_tail(stdout_f)
+                stderr = self._read_tail(stderr_f)
+
+            if return_code != 0:
                 raise FgbioError(
-                    f"fgbio {tool_name} failed with return code {result.returncode}: "
-                    f"{result.stderr}"
+                    f"fgbio {tool_name} failed with return code {return_code}: "
+                    f"{stderr}"
                 )
-            
+
             return {
                 "success": True,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "return_code": result.returncode,
-                "command": ' '.join(shlex.quote(str(c)) for c in cmd)
+                "stdout": stdout,
+                "stderr": stderr,
+                "return_code": return_code,
+                "command": cmd_str if cmd_str is not None else ' '.join(shlex.quote(str(c)) for c in cmd)
             }
-            
+
         except subprocess.TimeoutExpired:
             raise FgbioError(f"fgbio {tool_name} command timed out after 1 hour")
         except Exception as e:
             raise FgbioError(f"Failed to execute fgbio {tool_name}: {str(e)}")
+
+    def _run_in_jvm(self, tool_name: str, params: Dict[str, Any],
+                    common_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run an fgbio tool on the persistent in-process JVM.
+
+        Args:
+            tool_name: Name of the fgbio tool to run
+            params: Dictionary of parameters for the tool
+            common_params: Optional fgbio common options placed before the tool name
+
+        Returns:
+            Dictionary matching run_command's contract; the tool's own
+            logging goes to this process's stderr rather than being captured
+
+        Raises:
+            FgbioError: If the tool exits non-zero or the JVM call fails
+        """
+        args: List[str] = []
+        if common_params:
+            self._append_params(args, common_params)
+        args.append(tool_name)
+        self._append_params(args, params)
+
+        cmd_str = 'fgbio ' + ' '.join(shlex.quote(a) for a in args)
+        logger.info("Executing in-process: %s", cmd_str)
+
+        try:
+            return_code = int(self._jvm_main().makeItSo(jpype.JArray(jpype.JString)(args)))
+        except Exception as e:
+            raise FgbioError(f"Failed to execute fgbio {tool_name}: {str(e)}")
+
+        if return_code != 0:
+            raise FgbioError(
+                f"fgbio {tool_name} failed with return code {return_code}"
+            )
+
+        return {
+            "success": True,
+            "stdout": "",
+            "stderr": "",
+            "return_code": return_code,
+            "command": cmd_str
+        }
+
+    @staticmethod
+    def _advise_sequential_read(file_path: str) -> None:
+        """Hint the kernel that the input BAM will be read sequentially.
+
+        Widens the page-cache readahead window before the fgbio process
+        opens the file, and prefetches the companion .bai index if one
+        exists (it is read in full, up-front, when intervals are used);
+        a no-op on platforms without posix_fadvise.
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            with open(file_path, 'rb') as f:
+                os.posix_fadvise(
+                    f.fileno(), 0, 0,
+                    os.POSIX_FADV_SEQUENTIAL | os.POSIX_FADV_WILLNEED
+                )
+        except OSError:
+            # Advisory only; never fail the command over a hint
+            pass
+        for index_path in (file_path + ".bai", file_path[:-4] + ".bai" if file_path.endswith(".bam") else None):
+            if index_path is None or not os.path.isfile(index_path):
+                continue
+            try:
+                with open(index_path, 'rb') as f:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            except OSError:
+                pass
+            break
+
+    @staticmethod
+    def _maybe_skip_sort(input_bam: str, output_bam: str,
+                         sort_order: str) -> Optional[Dict[str, Any]]:
+        """Short-circuit a sort whose input already has the requested order.
+
+        Reads only the SAM header (one BGZF block via pysam) and compares
+        its ``SO:`` tag against the requested fgbio SamOrder. On a match the
+        output is hardlinked (copied across devices) instead of re-sorting
+        and re-encoding the whole file.
+
+        Returns:
+            A run_command-shaped result dict when the sort was skipped,
+            or None when the full sort must run (including whenever pysam
+            is unavailable or the header cannot be read)
+        """
+        # Random never matches a header SO value; always re-run it
+        if pysam is None or sort_order == "Random":
+            return None
+        try:
+            with pysam.AlignmentFile(input_bam, "rb", check_sq=False) as bam:
+                declared = bam.header.get("HD", {}).get("SO")
+        except (OSError, ValueError):
+            return None
+        if declared != sort_order.lower():
+            return None
+
+        if os.path.realpath(input_bam) != os.path.realpath(output_bam):
+            try:
+                if os.path.exists(output_bam):
+                    os.unlink(output_bam)
+                os.link(input_bam, output_bam)
+            except OSError:
+                # Cross-device or filesystem without hardlinks
+                shutil.copy2(input_bam, output_bam)
+
+        logger.info(
+            "Input already sorted (SO:%s); linked %s -> %s without re-sorting",
+            declared, input_bam, output_bam
+        )
+        return {
+            "success": True,
+            "stdout": "",
+            "stderr": "",
+            "return_code": 0,
+            "command": f"<skipped: {input_bam} already sorted by {declared}>"
+        }
+
+    @staticmethod
+    def _common_params(threads: Optional[int], async_io: bool,
+                       compression: Optional[int]) -> Dict[str, Any]:
+        """Build the fgbio common-option dictionary shared by all tools.
+
+        fgbio has no per-tool thread count; --async-io pipelines BAM
+        reading/writing onto background threads, and --compression trades
+        output size for deflate CPU.
+        """
+        common_params = {}
+        if async_io or threads:
+            common_params["async_io"] = True
+        if compression is not None:
+            common_params["compression"] = compression
+        return common_params
+
+    @staticmethod
+    def _read_tail(output_file, limit: int = 65536) -> str:
+        """Read at most the last `limit` bytes of a spooled output file."""
+        size = output_file.seek(0, os.SEEK_END)
+        output_file.seek(max(0, size - limit))
+        return output_file.read().decode('utf-8', errors='replace')
     
-    def sort_bam(self, input_bam: str, output_bam: str, sort_order: str = "coordinate", 
-                 temp_dir: Optional[str] = None, max_records_in_ram: Optional[int] = None) -> Dict[str, Any]:
+    def sort_bam(self, input_bam: str, output_bam: str, sort_order: str = "Coordinate",
+                 temp_dir: Optional[str] = None, max_records_in_ram: Optional[int] = None,
+                 threads: Optional[int] = None, async_io: bool = True,
+                 compression: Optional[int] = None) -> Dict[str, Any]:
         """Sort a BAM file using fgbio SortBam.
-        
+
         Args:
             input_bam: Path to input BAM file
             output_bam: Path to output BAM file
-            sort_order: Sort order (coordinate, queryname, random, unsorted)
+            sort_order: fgbio SamOrder value, pre-resolved by the caller
+                (Coordinate, Queryname, Random, Unsorted)
             temp_dir: Temporary directory for sorting
             max_records_in_ram: Maximum records to keep in memory
-            
+            threads: Enable pipelined BAM I/O when set (implies async_io)
+            async_io: Pipeline BAM reading/writing onto background threads
+            compression: BGZF compression level for the output (lower = less CPU)
+
         Returns:
             Dictionary containing execution results
         """
@@ -167,7 +395,16 @@ class FgbioWrapper:
         
         # Validate output path is writable
         self._validate_file_path(output_bam, must_exist=False)
-        
+
+        # Skip the sort entirely when the header already declares the
+        # requested order (common on idempotent pipeline re-runs)
+        skipped = self._maybe_skip_sort(input_bam, output_bam, sort_order)
+        if skipped is not None:
+            return skipped
+
+        # Prime page-cache readahead for the sequential BAM scan
+        self._advise_sequential_read(input_bam)
+
         params = {
             "input": input_bam,
             "output": output_bam,
@@ -179,8 +416,10 @@ class FgbioWrapper:
         
         if max_records_in_ram:
             params["max_records_in_ram"] = max_records_in_ram
-        
-        return self.run_command("SortBam", params)
+
+        common_params = self._common_params(threads, async_io, compression)
+
+        return self.run_command("SortBam", params, common_params)
     
     def filter_bam(self, input_bam: str, output_bam: str, 
                    rejects: Optional[str] = None,
@@ -192,9 +431,11 @@ class FgbioWrapper:
                    remove_secondary_alignments: bool = True,
                    min_insert_size: Optional[int] = None,
                    max_insert_size: Optional[int] = None,
-                   min_mapped_bases: Optional[int] = None) -> Dict[str, Any]:
+                   min_mapped_bases: Optional[int] = None,
+                   threads: Optional[int] = None, async_io: bool = True,
+                   compression: Optional[int] = None) -> Dict[str, Any]:
         """Filter a BAM file using fgbio FilterBam.
-        
+
         Args:
             input_bam: Path to input BAM file
             output_bam: Path to output BAM file
@@ -208,7 +449,10 @@ class FgbioWrapper:
             min_insert_size: Minimum insert size
             max_insert_size: Maximum insert size
             min_mapped_bases: Minimum number of mapped bases
-            
+            threads: Enable pipelined BAM I/O when set (implies async_io)
+            async_io: Pipeline BAM reading/writing onto background threads
+            compression: BGZF compression level for the output (lower = less CPU)
+
         Returns:
             Dictionary containing execution results
         """
@@ -223,7 +467,10 @@ class FgbioWrapper:
             self._validate_file_path(rejects, must_exist=False)
         if intervals:
             self._validate_file_path(intervals, must_exist=True)
-        
+
+        # Prime page-cache readahead for the sequential BAM scan
+        self._advise_sequential_read(input_bam)
+
         params = {
             "input": input_bam,
             "output": output_bam,
@@ -244,5 +491,7 @@ class FgbioWrapper:
             params["max_insert_size"] = max_insert_size
         if min_mapped_bases is not None:
             params["min_mapped_bases"] = min_mapped_bases
-        
-        return self.run_command("FilterBam", params)
\ No newline at end of file
+
+        common_params = self._common_params(threads, async_io, compression)
+
+        return self.run_command("FilterBam", params, common_params)
\ No newline at end of file
@@ -1,40 +1,96 @@
 """FastMCP server for fgbio BAM manipulation tools."""
 
+import asyncio
+import functools
+import json
 import logging
-from typing import Optional, Literal
-from pathlib import Path
+import os
+import time
+from typing import Any, List, Optional, Literal
 
 from fastmcp import FastMCP
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from .fgbio_wrapper import FgbioWrapper, FgbioError
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# orjson is optional: when installed, non-model tool results are encoded by
+# its Rust serializer instead of the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Library-style logging: a NullHandler at import time so embedding
+# applications control verbosity (and pay no formatting cost when logs are
+# off); main() configures real handlers for standalone runs
 logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+def _serialize_tool_result(value: Any) -> str:
+    """Serialize tool results on the MCP boundary.
+
+    Pydantic models (and lists of them, as sort_bam_batch returns) go
+    through model_dump_json, which uses pydantic's Rust serializer —
+    noticeably faster than json.dumps(model_dump()) when batch responses
+    carry kilobytes of captured fgbio output. Everything else falls back
+    to orjson when available, else the stdlib encoder.
+    """
+    if isinstance(value, BaseModel):
+        return value.model_dump_json()
+    if isinstance(value, list) and value and all(isinstance(v, BaseModel) for v in value):
+        return "[" + ",".join(v.model_dump_json() for v in value) + "]"
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value)
+
+
+# Initialize the MCP server. fastmcp 3.x dropped the tool_serializer
+# kwarg; fall back to the default serializer there instead of failing
+# at import time.
+try:
+    mcp = FastMCP("fgbio-bam-mcp", tool_serializer=_serialize_tool_result)
+except TypeError:
+    mcp = FastMCP("fgbio-bam-mcp")
 
-# Initialize the MCP server
-mcp = FastMCP("fgbio-bam-mcp")
+# Sort-order routing resolved once at import time: each request literal maps
+# straight to the value fgbio's --sort-order expects (fgbio's SamOrder names
+# are capitalized), so the wrapper does no per-call string re-checking
+_SORT_ORDER_FLAGS = {
+    "coordinate": "Coordinate",
+    "queryname": "Queryname",
+    "random": "Random",
+    "unsorted": "Unsorted",
+}
 
-# Global fgbio wrapper instance
-fgbio_wrapper = None
+# Shared immutable membership set for pre-validation: O(1) lookups without
+# rebuilding a collection per call. Kept in lockstep with the dispatch table.
+_ALLOWED_SORT_ORDERS = frozenset(_SORT_ORDER_FLAGS)
+
+# Constructing FgbioWrapper spawns a JVM for the version probe, so the
+# process-wide instance is memoized; lru_cache does not cache exceptions,
+# so a failed probe is retried on the next call
+@functools.lru_cache(maxsize=1)
+def _make_wrapper() -> FgbioWrapper:
+    """Construct the shared FgbioWrapper exactly once per process."""
+    return FgbioWrapper()
 
 
 def get_fgbio_wrapper() -> FgbioWrapper:
     """Get or create the fgbio wrapper instance."""
-    global fgbio_wrapper
-    if fgbio_wrapper is None:
-        try:
-            fgbio_wrapper = FgbioWrapper()
-        except FgbioError as e:
-            logger.error(f"Failed to initialize fgbio wrapper: {e}")
-            raise
-    return fgbio_wrapper
+    try:
+        return _make_wrapper()
+    except FgbioError as e:
+        logger.error("Failed to initialize fgbio wrapper: %s", e)
+        raise
 
 
 class SortBamRequest(BaseModel):
     """Request model for SortBam tool."""
-    
+
+    # FastMCP already validated the payload against the tool schema when it
+    # built this model; never re-run validation on instance passthrough
+    model_config = ConfigDict(revalidate_instances='never')
+
     input_bam: str = Field(
         ...,
         description="Path to the input BAM file to sort"
@@ -56,15 +112,37 @@ class SortBamRequest(BaseModel):
         gt=0,
         description="Maximum number of records to keep in memory during sorting"
     )
-    
+    threads: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Number of threads for BAM compression/IO (min(4, cpu_count) is usually enough)"
+    )
+    async_io: bool = Field(
+        default=True,
+        description="Pipeline BAM reading/writing onto background threads (fgbio --async-io)"
+    )
+    compression: int = Field(
+        default=1,
+        ge=0,
+        le=9,
+        description="BGZF compression level for the output BAM (lower = less CPU)"
+    )
+    skip_output_check: bool = Field(
+        default=False,
+        description="Skip the post-run stat of the output BAM; fgbio's exit code is still checked"
+    )
+
     @field_validator('input_bam', 'output_bam')
     @classmethod
     def validate_paths(cls, v):
         """Validate that paths are not empty strings."""
-        if not v or not v.strip():
+        # Strip once: the stripped value is both the emptiness check and the
+        # returned path, avoiding a second allocation per field
+        stripped = v.strip() if v else v
+        if not stripped:
             raise ValueError("Path cannot be empty")
-        return v.strip()
-    
+        return stripped
+
     @field_validator('temp_dir')
     @classmethod
     def validate_temp_dir(cls, v):
@@ -78,7 +156,11 @@ class SortBamRequest(BaseModel):
 
 class FilterBamRequest(BaseModel):
     """Request model for FilterBam tool."""
-    
+
+    # FastMCP already validated the payload against the tool schema when it
+    # built this model; never re-run validation on instance passthrough
+    model_config = ConfigDict(revalidate_instances='never')
+
     input_bam: str = Field(
         ...,
         description="Path to the input BAM file to filter"
@@ -131,14 +213,32 @@ class FilterBamRequest(BaseModel):
         gt=0,
         description="Minimum number of mapped bases"
     )
-    
+    threads: Optional[int] = Field(
+        default=None,
+        gt=0,
+        description="Number of threads for BAM compression/IO (min(4, cpu_count) is usually enough)"
+    )
+    async_io: bool = Field(
+        default=True,
+        description="Pipeline BAM reading/writing onto background threads (fgbio --async-io)"
+    )
+    compression: int = Field(
+        default=1,
+        ge=0,
+        le=9,
+        description="BGZF compression level for the output BAM (lower = less CPU)"
+    )
+
     @field_validator('input_bam', 'output_bam')
     @classmethod
     def validate_paths(cls, v):
         """Validate that paths are not empty strings."""
-        if not v or not v.strip():
+        # Strip once: the stripped value is both the emptiness check and the
+        # returned path, avoiding a second allocation per field
+        stripped = v.strip() if v else v
+        if not stripped:
             raise ValueError("Path cannot be empty")
-        return v.strip()
+        return stripped
     
     @field_validator('rejects', 'intervals')
     @classmethod
@@ -162,8 +262,14 @@ class FilterBamRequest(BaseModel):
 
 
 class SortBamResponse(BaseModel):
-    """Response model for SortBam tool."""
-    
+    """Response model for SortBam tool.
+
+    Built via model_construct: every field comes from our own code, so
+    re-validating them on each response is wasted work.
+    """
+
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     success: bool = Field(description="Whether the operation was successful")
     message: str = Field(description="Description of the operation result")
     input_file: str = Field(description="Path to the input BAM file")
@@ -184,8 +290,13 @@ class SortBamResponse(BaseModel):
 
 
 class FilterBamResponse(BaseModel):
-    """Response model for FilterBam tool."""
-    
+    """Response model for FilterBam tool.
+
+    Built via model_construct, same as SortBamResponse.
+    """
+
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     success: bool = Field(description="Whether the operation was successful")
     message: str = Field(description="Description of the operation result")
     input_file: str = Field(description="Path to the input BAM file")
@@ -213,109 +324,213 @@ class FilterBamResponse(BaseModel):
     )
 
 
-@mcp.tool()
-def sort_bam(request: SortBamRequest) -> SortBamResponse:
+@functools.lru_cache(maxsize=128)
+def _dir_writable(directory: str, _ttl_key: int) -> bool:
+    """Check (and cache) whether a directory is writable.
+
+    Batch runs sort into the same handful of directories over and over;
+    caching skips the repeated access() syscalls, which matter on
+    network-mounted scratch space. _ttl_key is a coarse time bucket so a
+    permission change is picked up within ~30 seconds.
     """
-    Sort a BAM file using fgbio SortBam tool.
-    
-    This tool sorts BAM files according to the specified sort order.
-    The most common sort orders are:
-    - coordinate: Sort by genomic coordinates (default)
-    - queryname: Sort by read name
-    - random: Random order
-    - unsorted: No specific order
-    
-    The tool validates input files exist and output directories are writable
-    before executing the fgbio command.
-    
-    Args:
-        request: SortBamRequest containing the sorting parameters
-        
-    Returns:
-        SortBamResponse with the operation results
+    return os.path.isdir(directory) and os.access(directory, os.W_OK)
+
+
+def _check_writable_dirs(output_bam: str, temp_dir: Optional[str] = None) -> None:
+    """Fail fast if the output (or temp) directory is not writable.
+
+    Raises:
+        FgbioError: If a target directory is missing or not writable
     """
+    ttl_key = int(time.monotonic() // 30)
+    out_dir = os.path.dirname(output_bam) or "."
+    if not _dir_writable(out_dir, ttl_key):
+        raise FgbioError(f"Output directory is not writable: {out_dir}")
+    if temp_dir is not None and not _dir_writable(temp_dir, ttl_key):
+        raise FgbioError(f"Temp directory is not writable: {temp_dir}")
+
+
+def _tail(output: Optional[str], limit: int = 16384) -> Optional[str]:
+    """Keep only the last `limit` characters of captured process output.
+
+    fgbio can emit megabytes of progress logging; only the tail matters for
+    debugging, and truncating here keeps response memory and JSON-encoding
+    cost O(1) regardless of input size.
+    """
+    if output is None or len(output) <= limit:
+        return output
+    return "...(truncated)...\n" + output[-limit:]
+
+
+def _sort_bam_impl(request: SortBamRequest) -> SortBamResponse:
+    """Run one SortBam operation; shared by sort_bam and sort_bam_batch."""
+    # Bind the hot fields once: pydantic model attribute access is pricier
+    # than a local, and these are read in every branch below
+    input_bam = request.input_bam
+    output_bam = request.output_bam
+    sort_order = request.sort_order
     try:
-        logger.info(f"Sorting BAM file: {request.input_bam} -> {request.output_bam}")
-        
+        logger.info("Sorting BAM file: %s -> %s", input_bam, output_bam)
+
+        # Fail fast on unwritable target directories (cached across the batch)
+        _check_writable_dirs(output_bam, request.temp_dir)
+
         # Get the fgbio wrapper
         wrapper = get_fgbio_wrapper()
-        
+
         # Execute the sort operation
         result = wrapper.sort_bam(
-            input_bam=request.input_bam,
-            output_bam=request.output_bam,
-            sort_order=request.sort_order,
+            input_bam=input_bam,
+            output_bam=output_bam,
+            sort_order=_SORT_ORDER_FLAGS[sort_order],
             temp_dir=request.temp_dir,
-            max_records_in_ram=request.max_records_in_ram
+            max_records_in_ram=request.max_records_in_ram,
+            threads=request.threads,
+            async_io=request.async_io,
+            compression=request.compression
         )
         
-        # Check if output file was created
-        output_path = Path(request.output_bam)
-        if not output_path.exists():
-            raise FgbioError("Output BAM file was not created")
-        
-        return SortBamResponse(
+        # Check if output file was created; a bare os.stat skips the pathlib
+        # object construction, and zero size catches truncated writes (even
+        # a header-only BAM is a few hundred bytes). Trusted batch callers
+        # can opt out — the wrapper already checked fgbio's exit code — to
+        # save one stat per call on slow network filesystems.
+        if not request.skip_output_check:
+            try:
+                output_stat = os.stat(output_bam)
+            except FileNotFoundError:
+                raise FgbioError("Output BAM file was not created")
+            if output_stat.st_size == 0:
+                raise FgbioError("Output BAM file is empty")
+
+        return SortBamResponse.model_construct(
             success=True,
-            message=f"Successfully sorted BAM file with sort order '{request.sort_order}'",
-            input_file=request.input_bam,
-            output_file=request.output_bam,
-            sort_order=request.sort_order,
+            message=f"Successfully sorted BAM file with sort order '{sort_order}'",
+            input_file=input_bam,
+            output_file=output_bam,
+            sort_order=sort_order,
             command_executed=result.get("command"),
-            stdout=result.get("stdout"),
-            stderr=result.get("stderr")
+            stdout=_tail(result.get("stdout")),
+            stderr=_tail(result.get("stderr"))
         )
         
     except FgbioError as e:
-        logger.error(f"fgbio error in sort_bam: {e}")
-        return SortBamResponse(
+        logger.error("fgbio error in sort_bam: %s", e)
+        return SortBamResponse.model_construct(
             success=False,
             message=f"fgbio error: {str(e)}",
-            input_file=request.input_bam,
-            output_file=request.output_bam,
-            sort_order=request.sort_order
+            input_file=input_bam,
+            output_file=output_bam,
+            sort_order=sort_order
         )
     except Exception as e:
-        logger.error(f"Unexpected error in sort_bam: {e}")
-        return SortBamResponse(
+        logger.error("Unexpected error in sort_bam: %s", e)
+        return SortBamResponse.model_construct(
             success=False,
             message=f"Unexpected error: {str(e)}",
-            input_file=request.input_bam,
-            output_file=request.output_bam,
-            sort_order=request.sort_order
+            input_file=input_bam,
+            output_file=output_bam,
+            sort_order=sort_order
         )
 
 
 @mcp.tool()
-def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
+async def sort_bam(request: SortBamRequest) -> SortBamResponse:
     """
-    Filter a BAM file using fgbio FilterBam tool.
-    
-    This tool removes reads that may not be useful in downstream processing or 
-    visualization. By default it removes unmapped reads, reads with MAPQ=0, 
-    reads marked as secondary alignments, and reads marked as duplicates.
-    
-    Additional filters can be applied:
-    - Minimum mapping quality threshold
-    - Insert size filtering
-    - Minimum mapped bases requirement
-    - Interval-based filtering
-    - Single-end mapping removal
-    
+    Sort a BAM file using fgbio SortBam tool.
+
+    This tool sorts BAM files according to the specified sort order.
+    The most common sort orders are:
+    - coordinate: Sort by genomic coordinates (default)
+    - queryname: Sort by read name
+    - random: Random order
+    - unsorted: No specific order
+
     The tool validates input files exist and output directories are writable
     before executing the fgbio command.
-    
+
     Args:
-        request: FilterBamRequest containing the filtering parameters
-        
+        request: SortBamRequest containing the sorting parameters
+
     Returns:
-        FilterBamResponse with the operation results
+        SortBamResponse with the operation results
     """
+    # The fgbio subprocess (and the file stats around it) can block for
+    # minutes; running the impl in a worker thread keeps the event loop free
+    # to serve other requests in the meantime
+    return await asyncio.to_thread(_sort_bam_impl, request)
+
+
+@mcp.tool()
+async def sort_bam_batch(
+    requests: List[SortBamRequest],
+    max_concurrent: int = 4,
+    stop_on_error: bool = False
+) -> List[SortBamResponse]:
+    """
+    Sort multiple BAM files in one call using fgbio SortBam.
+
+    Each entry is an independent SortBamRequest; sorts run concurrently up
+    to max_concurrent, so I/O-bound jobs overlap and the per-call JSON-RPC
+    framing cost is paid once for the whole batch instead of per file.
+
+    Args:
+        requests: List of SortBamRequest entries to execute
+        max_concurrent: Maximum number of fgbio processes in flight at once
+        stop_on_error: When true, requests not yet started after a failure
+            are skipped and reported as failed
+
+    Returns:
+        List of SortBamResponse results, in the same order as the requests
+    """
+    # Clamp to at least 1: Semaphore(0) would deadlock the whole batch and
+    # a negative value raises; schema-valid input must not wedge the server
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    failed = asyncio.Event()
+
+    async def _run_one(request: SortBamRequest) -> SortBamResponse:
+        # Entries built programmatically (model_construct, or passthrough
+        # with revalidate_instances='never') bypass the Literal check, so
+        # verify membership here before an fgbio process is spawned for them
+        if request.sort_order not in _ALLOWED_SORT_ORDERS:
+            return SortBamResponse.model_construct(
+                success=False,
+                message=(
+                    f"Invalid sort order '{request.sort_order}' "
+                    f"(allowed: {', '.join(sorted(_ALLOWED_SORT_ORDERS))})"
+                ),
+                input_file=request.input_bam,
+                output_file=request.output_bam,
+                sort_order=request.sort_order
+            )
+        async with semaphore:
+            if stop_on_error and failed.is_set():
+                return SortBamResponse.model_construct(
+                    success=False,
+                    message="Skipped because an earlier request in the batch failed",
+                    input_file=request.input_bam,
+                    output_file=request.output_bam,
+                    sort_order=request.sort_order
+                )
+            response = await asyncio.to_thread(_sort_bam_impl, request)
+            if not response.success:
+                failed.set()
+            return response
+
+    return list(await asyncio.gather(*(_run_one(r) for r in requests)))
+
+
+def _filter_bam_impl(request: FilterBamRequest) -> FilterBamResponse:
+    """Run one FilterBam operation; called from a worker thread."""
     try:
-        logger.info(f"Filtering BAM file: {request.input_bam} -> {request.output_bam}")
+        logger.info("Filtering BAM file: %s -> %s", request.input_bam, request.output_bam)
         
+        # Fail fast on unwritable target directories (cached across the batch)
+        _check_writable_dirs(request.output_bam)
+
         # Get the fgbio wrapper
         wrapper = get_fgbio_wrapper()
-        
+
         # Execute the filter operation
         result = wrapper.filter_bam(
             input_bam=request.input_bam,
@@ -329,13 +544,21 @@ def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
             remove_secondary_alignments=request.remove_secondary_alignments,
             min_insert_size=request.min_insert_size,
             max_insert_size=request.max_insert_size,
-            min_mapped_bases=request.min_mapped_bases
+            min_mapped_bases=request.min_mapped_bases,
+            threads=request.threads,
+            async_io=request.async_io,
+            compression=request.compression
         )
         
-        # Check if output file was created
-        output_path = Path(request.output_bam)
-        if not output_path.exists():
+        # Check if output file was created; a bare os.stat skips the pathlib
+        # object construction, and zero size catches truncated writes (even
+        # a header-only BAM is a few hundred bytes)
+        try:
+            output_stat = os.stat(request.output_bam)
+        except FileNotFoundError:
             raise FgbioError("Output BAM file was not created")
+        if output_stat.st_size == 0:
+            raise FgbioError("Output BAM file is empty")
         
         # Create summary of filters applied
         filters_applied = {
@@ -355,7 +578,7 @@ def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
         if request.intervals:
             filters_applied["intervals_filter"] = True
         
-        return FilterBamResponse(
+        return FilterBamResponse.model_construct(
             success=True,
             message="Successfully filtered BAM file",
             input_file=request.input_bam,
@@ -364,13 +587,13 @@ def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
             intervals_file=request.intervals,
             filters_applied=filters_applied,
             command_executed=result.get("command"),
-            stdout=result.get("stdout"),
-            stderr=result.get("stderr")
+            stdout=_tail(result.get("stdout")),
+            stderr=_tail(result.get("stderr"))
         )
         
     except FgbioError as e:
-        logger.error(f"fgbio error in filter_bam: {e}")
-        return FilterBamResponse(
+        logger.error("fgbio error in filter_bam: %s", e)
+        return FilterBamResponse.model_construct(
             success=False,
             message=f"fgbio error: {str(e)}",
             input_file=request.input_bam,
@@ -380,8 +603,8 @@ def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
             filters_applied={}
         )
     except Exception as e:
-        logger.error(f"Unexpected error in filter_bam: {e}")
-        return FilterBamResponse(
+        logger.error("Unexpected error in filter_bam: %s", e)
+        return FilterBamResponse.model_construct(
             success=False,
             message=f"Unexpected error: {str(e)}",
             input_file=request.input_bam,
@@ -392,8 +615,52 @@ def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
         )
 
 
+@mcp.tool()
+async def filter_bam(request: FilterBamRequest) -> FilterBamResponse:
+    """
+    Filter a BAM file using fgbio FilterBam tool.
+
+    This tool removes reads that may not be useful in downstream processing or
+    visualization. By default it removes unmapped reads, reads with MAPQ=0,
+    reads marked as secondary alignments, and reads marked as duplicates.
+
+    Additional filters can be applied:
+    - Minimum mapping quality threshold
+    - Insert size filtering
+    - Minimum mapped bases requirement
+    - Interval-based filtering
+    - Single-end mapping removal
+
+    The tool validates input files exist and output directories are writable
+    before executing the fgbio command.
+
+    Args:
+        request: FilterBamRequest containing the filtering parameters
+
+    Returns:
+        FilterBamResponse with the operation results
+    """
+    # Same offload as sort_bam: the fgbio subprocess blocks for the duration
+    # of the filter, so run it off the event loop
+    return await asyncio.to_thread(_filter_bam_impl, request)
+
+
+def _configure_logging() -> None:
+    """Configure root logging for standalone runs, exactly once.
+
+    Safe under worker forks and repeated imports: if the root logger
+    already has handlers — attached by a parent process, an embedding
+    application, or a prior call — this is a no-op, so handlers are never
+    duplicated and library consumers keep control of levels.
+    """
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
+
+
 def main():
     """Main entry point for the MCP server."""
+    _configure_logging()
+
     try:
         logger.info("Starting fgbio BAM MCP server...")
         
@@ -404,10 +671,10 @@ def main():
         mcp.run()
         
     except FgbioError as e:
-        logger.error(f"Failed to start server due to fgbio error: {e}")
+        logger.error("Failed to start server due to fgbio error: %s", e)
         raise
     except Exception as e:
-        logger.error(f"Failed to start server: {e}")
+        logger.error("Failed to start server: %s", e)
         raise
 
 